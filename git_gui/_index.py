@@ -0,0 +1,89 @@
+"""Minimal reader for the git index file.
+
+Only what :meth:`Repository.status` needs is parsed: the path and mode of
+each entry, which tell tracked files and submodules apart from untracked
+ones. Index versions 2 and 3 are supported; ``read_index`` returns ``None``
+for anything else (version 4 path compression, split or sparse indexes) so
+callers can fall back to git.
+"""
+
+import mmap
+import os
+import stat
+import struct
+from typing import List, NamedTuple, Optional
+
+_HEADER = struct.Struct('>4sLL')
+# fixed part of an entry, one per hash size: ctime, mtime, dev and ino
+# (skipped), mode, uid, gid and size (skipped), the object name (skipped), flags
+_ENTRY = {size: struct.Struct(f'>24xL12x{size}xH') for size in (20, 32)}
+_EXTENSION = struct.Struct('>4sL')
+
+_EXTENDED = 0x4000
+_NAME_MASK = 0x0FFF
+
+_S_IFGITLINK = 0o160000
+
+
+class IndexEntry(NamedTuple):
+    path: str
+    mode: int
+
+
+def read_index(path: str, hash_size: int = 20) -> Optional[List[IndexEntry]]:
+    """Parse the index at *path*, or return ``None`` if it is unsupported."""
+    try:
+        fh = open(path, 'rb')
+    except FileNotFoundError:
+        return []
+    with fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse(mm, hash_size)
+
+
+def _parse(buf: mmap.mmap, hash_size: int) -> Optional[List[IndexEntry]]:
+    signature, version, count = _HEADER.unpack_from(buf, 0)
+    if signature != b'DIRC' or version not in (2, 3):
+        return None
+    # hot loop over every index entry: bind everything it touches to locals
+    unpack_entry = _ENTRY[hash_size].unpack_from
+    find = buf.find
+    fixed_size = _ENTRY[hash_size].size
+    is_dir = stat.S_ISDIR
+    entries: List[IndexEntry] = []
+    append = entries.append
+    # tuple.__new__ skips the keyword handling of the generated __new__
+    new_entry = tuple.__new__
+    offset = _HEADER.size
+    for _ in range(count):
+        mode, flags = unpack_entry(buf, offset)
+        name_start = offset + fixed_size
+        if flags & _EXTENDED:
+            name_start += 2
+        name_len = flags & _NAME_MASK
+        if name_len == _NAME_MASK:
+            name_len = find(b'\0', name_start) - name_start
+        if is_dir(mode):
+            return None  # sparse-index directory entry
+        append(new_entry(IndexEntry, (
+            buf[name_start:name_start + name_len].decode('utf-8', 'surrogateescape'),
+            mode,
+        )))
+        # entries are NUL padded to a multiple of eight bytes
+        offset += (name_start - offset + name_len + 8) & ~7
+
+    end = len(buf) - hash_size
+    while offset + _EXTENSION.size <= end:
+        signature, length = _EXTENSION.unpack_from(buf, offset)
+        if signature in (b'link', b'sdir'):
+            return None  # split or sparse index
+        offset += _EXTENSION.size + length
+    return entries
+
+
+def is_gitlink(entry: IndexEntry) -> bool:
+    """Return True if *entry* records a submodule commit."""
+    return stat.S_IFMT(entry.mode) == _S_IFGITLINK
+
@@ -0,0 +1,230 @@
+"""Directory-mtime cache for the untracked file walk.
+
+This follows the idea behind git's own untracked cache: adding, removing or
+renaming an entry updates the mtime of its directory. A directory whose mtime
+and ``.gitignore`` are unchanged since the last walk therefore still has the
+same listing, so it is not ``scandir()``-ed again. Ignore rules are
+evaluated by git (``check-ignore``) and only for the entries of directories
+that had to be rescanned.
+"""
+
+import gzip
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+CACHE_VERSION = 1
+
+# directories modified this recently may change again within the same
+# timestamp tick (two seconds on FAT), so their listing is not trusted later
+_RACY_NS = 2_000_000_000
+
+# [mtime_ns, .gitignore token, is nested repository, files, subdirectories]
+_DirRecord = list
+_Token = Optional[List[int]]
+
+
+def stat_token(path: str) -> _Token:
+    """Return a cheap change token for *path*, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def is_racy(token: _Token, now: Optional[int] = None) -> bool:
+    """Return True if a change right after *token* could leave it unchanged.
+
+    *now* is the reference time in nanoseconds, by default the current time;
+    pass the time a read started to judge tokens taken for that read.
+    """
+    if now is None:
+        now = time.time_ns()
+    return token is not None and token[0] >= now - _RACY_NS
+
+
+def _join(rel: str, name: str) -> str:
+    return f"{rel}/{name}" if rel else name
+
+
+class UntrackedCache:
+    """Cached listing of untracked, non-ignored files below *root*."""
+
+    def __init__(self, root: str, cache_path: str, exclude_files: List[str]) -> None:
+        self.root = root
+        self.cache_path = cache_path
+        self.exclude_files = exclude_files
+        self._dirs: Dict[str, _DirRecord] = {}
+        self._global: Optional[List[_Token]] = None
+        self._loaded = False
+        self._dirty = False
+
+    def untracked(
+        self,
+        tracked: Set[str],
+        gitlinks: Set[str],
+        ignored: Callable[[List[str], bool], Set[str]],
+        prefix: str = '',
+    ) -> List[str]:
+        """Return untracked paths, walking only directories that changed.
+
+        *tracked* holds the index paths, *gitlinks* the submodule paths among
+        them, and *ignored* maps a batch of paths to the subset matched by
+        ignore rules. Its second argument is True when ignore files changed
+        since the previous call, so rules read earlier must not be reused.
+        With a *prefix* only paths starting with it are returned and only
+        directories that can contain such paths are visited.
+        """
+        if not self._loaded:
+            self._load()
+        global_token = [stat_token(p) for p in self.exclude_files]
+        reload = reloaded = False
+        if global_token != self._global:
+            self._dirs.clear()
+            self._global = global_token
+            self._dirty = True
+            reload = True
+
+        result: List[str] = []
+        visited: Set[str] = set()
+        # breadth first, so each tree level needs a single ignore check
+        level: List[Tuple[str, bool]] = [('', False)]
+        while level:
+            next_level: List[Tuple[str, bool]] = []
+            rescanned = []
+            for rel, rules_changed in level:
+                visited.add(rel)
+                path = os.path.join(self.root, rel)
+                try:
+                    mtime = os.lstat(path).st_mtime_ns
+                except OSError:
+                    continue
+                token = stat_token(os.path.join(path, '.gitignore'))
+                record = self._dirs.get(rel)
+                if record is None or record[1] != token:
+                    rules_changed = True
+                    reload = not reloaded
+                if not rules_changed and record[0] == mtime:
+                    self._emit(rel, record, tracked, gitlinks, prefix, result, next_level, False)
+                    continue
+                try:
+                    with os.scandir(path) as it:
+                        entries = [(e.name, e.is_dir(follow_symlinks=False)) for e in it]
+                except OSError:
+                    continue
+                is_repo = any(name == '.git' for name, _ in entries)
+                entries = [(n, d) for n, d in entries if n != '.git']
+                rescanned.append((rel, mtime, token, is_repo, entries, rules_changed))
+
+            if rescanned:
+                excluded = ignored([
+                    _join(rel, name)
+                    for rel, _, _, _, entries, _ in rescanned
+                    for name, _ in entries
+                ], reload)
+                # rules read from here on are current for this walk
+                reloaded = reloaded or reload
+                reload = False
+                for rel, mtime, token, is_repo, entries, rules_changed in rescanned:
+                    kept = [(n, d) for n, d in entries if _join(rel, n) not in excluded]
+                    record = [
+                        -1 if is_racy([mtime]) else mtime,
+                        token,
+                        is_repo,
+                        sorted(n for n, d in kept if not d),
+                        sorted(n for n, d in kept if d),
+                    ]
+                    self._store(rel, record)
+                    self._emit(
+                        rel, record, tracked, gitlinks, prefix, result, next_level, rules_changed
+                    )
+            level = next_level
+
+        if not prefix:
+            # a partial walk cannot tell skipped directories from deleted ones
+            for rel in [r for r in self._dirs if r not in visited]:
+                del self._dirs[rel]
+                self._dirty = True
+        self._save()
+        result.sort()
+        return result
+
+    def _store(self, rel: str, record: _DirRecord) -> None:
+        # racy directories are rescanned on every walk; storing the same
+        # record again must not rewrite the cache file each time
+        if self._dirs.get(rel) != record:
+            self._dirs[rel] = record
+            self._dirty = True
+
+    @staticmethod
+    def _emit(
+        rel: str,
+        record: _DirRecord,
+        tracked: Set[str],
+        gitlinks: Set[str],
+        prefix: str,
+        result: List[str],
+        next_level: List[Tuple[str, bool]],
+        rules_changed: bool,
+    ) -> None:
+        if record[2] and rel:
+            # a nested repository is reported as a whole, like git does,
+            # unless the index has paths inside it
+            dir_prefix = rel + '/'
+            if rel in gitlinks:
+                return
+            if not any(path.startswith(dir_prefix) for path in tracked):
+                if dir_prefix.startswith(prefix):
+                    result.append(dir_prefix)
+                return
+        for name in record[3]:
+            path = _join(rel, name)
+            if path not in tracked and path.startswith(prefix):
+                result.append(path)
+        for name in record[4]:
+            path = _join(rel, name)
+            if path in gitlinks:
+                continue
+            # descend only where paths starting with prefix can be found
+            if path.startswith(prefix) or prefix.startswith(path + '/'):
+                next_level.append((path, rules_changed))
+
+    # ------------------------------------------------------------------
+    # Persistence between runs
+
+    def _load(self) -> None:
+        self._loaded = True
+        try:
+            with gzip.open(self.cache_path, 'rt', encoding='utf-8') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != CACHE_VERSION or data.get('root') != self.root:
+            return
+        self._global = data.get('global')
+        self._dirs = data.get('dirs', {})
+
+    def _save(self) -> None:
+        if not self._dirty:
+            return
+        data = {
+            'version': CACHE_VERSION,
+            'root': self.root,
+            'global': self._global,
+            'dirs': self._dirs,
+        }
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as fh:
+                json.dump(data, fh, separators=(',', ':'))
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # the cache is an optimisation; a read-only .git is not an error
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._dirty = False
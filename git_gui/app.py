@@ -1,16 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import List
-from PyQt6.QtCore import Qt
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple
+from PyQt6.QtCore import Qt, QThreadPool, QTimer
 from PyQt6.QtWidgets import (
+    QAbstractItemView,
     QApplication,
-    QFileDialog,
+    QLabel,
     QListView,
     QMainWindow,
     QMenu,
     QMenuBar,
     QMessageBox,
+    QPlainTextEdit,
+    QProgressBar,
     QComboBox,
     QTextEdit,
     QToolBar,
@@ -18,10 +22,13 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
 )
 
-from .git_backend import Repository, FileStatus
+from .git_backend import Repository, FileStatus, RepositoryState
 from .models import FileStatusModel
 from .diff_highlighter import DiffHighlighter
-from .diff_viewer import DiffViewer
+from .workers import GitWorker
+
+if TYPE_CHECKING:
+    from .diff_viewer import DiffViewer
 
 class GitGuiApp(QMainWindow):
     def __init__(self, repo_path: str) -> None:
@@ -34,19 +41,37 @@ class GitGuiApp(QMainWindow):
         self.status_model = FileStatusModel()
         self.status_view = QListView()
         self.status_view.setModel(self.status_model)
+        # every row is a single line of text, so let Qt skip per-row size
+        # measurement and lay out large status lists in batches
+        self.status_view.setViewMode(QListView.ViewMode.ListMode)
+        self.status_view.setUniformItemSizes(True)
+        self.status_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.status_view.setBatchSize(64)
+        self.status_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.status_view.doubleClicked.connect(self._show_diff_index)
         self.status_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.status_view.customContextMenuRequested.connect(self._show_status_menu)
         self.commit_msg = QTextEdit()
-        self.log_view = QTextEdit()
+        self.log_view = QPlainTextEdit()
         self.log_view.setReadOnly(True)
+        self.log_view.setMaximumBlockCount(10000)
         self._diff_highlighter = DiffHighlighter(self.log_view.document())
         self.branch_box = QComboBox()
         # PyQt6 removed the overloaded signal selector syntax
         # (e.g. `activated[str]`). Use the explicit textActivated signal to
         # receive the selected branch name instead.
         self.branch_box.textActivated.connect(self._checkout_branch)
-        self._diff_viewer = DiffViewer(self)
+        self._diff_viewer: Optional[DiffViewer] = None  # created on first use
+        # a single worker thread serializes every git call off the GUI thread
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._workers: set[GitWorker] = set()
+        self._refresh_pending = False
+        # the refresh in flight, if any, and whether another one was asked
+        # for meanwhile; the list keeps showing the last state until then
+        self._refresh_worker: Optional[GitWorker] = None
+        self._refresh_again = False
+        self._branch_state: Optional[Tuple[List[str], str]] = None
 
         central = QWidget()
         layout = QVBoxLayout()
@@ -61,6 +86,7 @@ class GitGuiApp(QMainWindow):
 
         self._create_menu()
         self._create_toolbar()
+        self._create_status_menu()
         self.refresh()
 
     def _create_menu(self) -> None:
@@ -75,6 +101,8 @@ class GitGuiApp(QMainWindow):
         git_menu = QMenu("Git", self)
         commit_action = git_menu.addAction("Commit")
         commit_action.triggered.connect(self.commit)
+        commit_all_action = git_menu.addAction("Commit All")
+        commit_all_action.triggered.connect(self.commit_all)
         pull_action = git_menu.addAction("Pull")
         pull_action.triggered.connect(self.pull)
         push_action = git_menu.addAction("Push")
@@ -85,37 +113,128 @@ class GitGuiApp(QMainWindow):
 
         self.setMenuBar(menu_bar)
 
+    def _create_status_menu(self) -> None:
+        # built once; _show_status_menu only toggles action visibility
+        self._ctx_menu = QMenu(self)
+        self._ctx_status: Optional[FileStatus] = None
+        self._ctx_targets: List[FileStatus] = []
+        self._act_add = self._ctx_menu.addAction("Add File to Repo")
+        self._act_add.triggered.connect(self._stage_targets)
+        self._act_ignore = self._ctx_menu.addAction("Ignore File")
+        self._act_ignore.triggered.connect(self._ignore_targets)
+        self._act_stage = self._ctx_menu.addAction("Stage File")
+        self._act_stage.triggered.connect(self._stage_targets)
+        self._act_unstage = self._ctx_menu.addAction("Unstage File")
+        self._act_unstage.triggered.connect(self._unstage_targets)
+        self._act_diff = self._ctx_menu.addAction("Show Diff")
+        self._act_diff.triggered.connect(self._diff_target)
+
     def _create_toolbar(self) -> None:
         toolbar = QToolBar("Main")
         self.addToolBar(toolbar)
         refresh_action = toolbar.addAction("Refresh")
-        refresh_action.triggered.connect(self.refresh)
+        refresh_action.triggered.connect(self.reload)
         pull_action = toolbar.addAction("Pull")
         pull_action.triggered.connect(self.pull)
         push_action = toolbar.addAction("Push")
         push_action.triggered.connect(self.push)
+        busy = QProgressBar()
+        busy.setRange(0, 0)
+        busy.setMaximumWidth(120)
+        self._busy_action = toolbar.addWidget(busy)
+        self._busy_action.setVisible(False)
+
+    def _run_git(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_failed: Optional[Callable[[], None]] = None,
+    ) -> GitWorker:
+        """Run *fn* on the git worker thread and pass its result to *on_done*.
+
+        *on_failed* is called after the error has been shown.
+        """
+        worker = GitWorker(fn, *args, on_done=on_done, on_failed=on_failed)
+        worker.signals.finished.connect(self._on_worker_finished)
+        worker.signals.failed.connect(self._on_worker_failed)
+        self._workers.add(worker)
+        self._busy_action.setVisible(True)
+        self._pool.start(worker)
+        return worker
+
+    def _on_worker_finished(self, worker: GitWorker, result: Any) -> None:
+        self._workers.discard(worker)
+        self._busy_action.setVisible(bool(self._workers))
+        if worker.on_done is not None:
+            worker.on_done(result)
+        self._refresh_finished(worker)
+
+    def _on_worker_failed(self, worker: GitWorker, message: str) -> None:
+        self._workers.discard(worker)
+        self._busy_action.setVisible(bool(self._workers))
+        QMessageBox.critical(self, "Error", message)
+        if worker.on_failed is not None:
+            worker.on_failed()
+        self._refresh_finished(worker)
 
     def open_repo(self) -> None:
+        from PyQt6.QtWidgets import QFileDialog
+
         path = QFileDialog.getExistingDirectory(self, "Open Repository", os.getcwd())
         if path:
             try:
-                self.repo = Repository(path)
-                self.refresh()
+                repo = Repository(path)
             except ValueError as exc:
                 QMessageBox.critical(self, "Error", str(exc))
+            else:
+                # queued behind any git call still using the old repository
+                self._run_git(self.repo.close)
+                self.repo = repo
+                self._branch_state = None
+                self.refresh()
 
     def refresh(self) -> None:
-        statuses = self.repo.status()
-        self.status_model.update_statuses(statuses)
-        self.log_view.setPlainText(self.repo.log())
-        self._populate_branches()
+        """Schedule a refresh, collapsing requests that arrive back to back."""
+        if self._refresh_pending:
+            return
+        self._refresh_pending = True
+        QTimer.singleShot(30, self._do_refresh)
+
+    def reload(self) -> None:
+        """Re-read everything from disk, including memoized repository state."""
+        self._run_git(self.repo.invalidate, on_done=self._after_history_change)
+
+    def _do_refresh(self) -> None:
+        self._refresh_pending = False
+        if self._refresh_worker is not None:
+            self._refresh_again = True
+            return
+        self._refresh_worker = self._run_git(
+            self._read_state, self.repo, on_done=self._apply_state
+        )
 
-    def _current_branch(self) -> str:
-        return self.repo.current_branch()
+    def _refresh_finished(self, worker: GitWorker) -> None:
+        if worker is not self._refresh_worker:
+            return
+        self._refresh_worker = None
+        if self._refresh_again:
+            self._refresh_again = False
+            self.refresh()
+
+    @staticmethod
+    def _read_state(repo: Repository) -> RepositoryState:
+        return asyncio.run(repo.refresh())
+
+    def _apply_state(self, state: RepositoryState) -> None:
+        self.status_model.update_statuses(state.statuses)
+        self.log_view.setPlainText(state.log)
+        self._populate_branches(state.branches, state.current_branch)
 
-    def _populate_branches(self) -> None:
-        branches = self.repo.branches()
-        current = self._current_branch()
+    def _populate_branches(self, branches: List[str], current: str) -> None:
+        if self._branch_state == (branches, current):
+            return
+        self._branch_state = (branches, current)
         self.branch_box.blockSignals(True)
         self.branch_box.clear()
         self.branch_box.addItems(branches)
@@ -125,18 +244,37 @@ class GitGuiApp(QMainWindow):
 
     def _checkout_branch(self, branch: str) -> None:
         if branch:
-            self.repo.checkout(branch)
-            self.refresh()
+            self._run_git(
+                self.repo.checkout,
+                branch,
+                on_done=self._after_history_change,
+                on_failed=self._reset_branches,
+            )
+
+    def _reset_branches(self) -> None:
+        # the combo box already shows the branch that was picked; let the
+        # next refresh put back the one HEAD is really on
+        self._branch_state = None
+        self.refresh()
 
     def _show_diff_index(self, index) -> None:
         status = self.status_model.status_at(index)
         if status:
-            self._display_diff(status.path)
+            self._display_diff(status)
+
+    def _display_diff(self, status: FileStatus) -> None:
+        # the backend caches diffs itself; files changed only in the index
+        # show their staged diff
+        staged = status.status[:1] not in (' ', '?') and status.status[1:2] == ' '
+        self._run_git(self.repo.diff, status.path, staged, on_done=self._show_diff_text)
 
-    def _display_diff(self, path: str) -> None:
-        diff = self.repo.diff(path)
+    def _show_diff_text(self, diff: str) -> None:
         if not diff.strip():
             diff = 'No changes'
+        if self._diff_viewer is None:
+            from .diff_viewer import DiffViewer
+
+            self._diff_viewer = DiffViewer(self)
         self._diff_viewer.set_diff(diff)
         self._diff_viewer.show()
 
@@ -148,64 +286,114 @@ class GitGuiApp(QMainWindow):
         if item is None:
             return
         status = item
-        menu = QMenu(self)
-
+        # act on the whole selection when the clicked row is part of it
+        if self.status_view.selectionModel().isSelected(index):
+            targets = [
+                s for s in (
+                    self.status_model.status_at(i)
+                    for i in self.status_view.selectionModel().selectedRows()
+                )
+                if s is not None
+            ]
+        else:
+            targets = [status]
         index_state = status.status[0] if len(status.status) > 0 else ' '
         work_state = status.status[1] if len(status.status) > 1 else ' '
+        untracked = status.status == '??'
 
-        stage_action = None
-        unstage_action = None
-        add_action = None
-        ignore_action = None
+        self._ctx_status = status
+        self._ctx_targets = targets
+        self._act_add.setVisible(untracked)
+        self._act_ignore.setVisible(untracked)
+        self._act_stage.setVisible(not untracked and work_state != ' ')
+        self._act_unstage.setVisible(not untracked and index_state != ' ')
+        self._ctx_menu.exec(self.status_view.mapToGlobal(pos))
 
-        if status.status == '??':
-            add_action = menu.addAction("Add File to Repo")
-            ignore_action = menu.addAction("Ignore File")
-        else:
-            if work_state != ' ':
-                stage_action = menu.addAction("Stage File")
-            if index_state != ' ':
-                unstage_action = menu.addAction("Unstage File")
+    def _stage_targets(self) -> None:
+        paths = [
+            t.path for t in self._ctx_targets
+            if t.status == '??' or t.status[1:2] not in ('', ' ')
+        ]
+        self._change_index(self.repo.stage, paths)
 
-        diff_action = menu.addAction("Show Diff")
-        action = menu.exec(self.status_view.mapToGlobal(pos))
+    def _unstage_targets(self) -> None:
+        paths = [
+            t.path for t in self._ctx_targets
+            if t.status != '??' and t.status[:1] not in ('', ' ')
+        ]
+        self._change_index(self.repo.unstage, paths)
 
-        if action == stage_action:
-            self.repo.stage([status.path])
-            self.refresh()
-        elif action == unstage_action:
-            self.repo.unstage([status.path])
-            self.refresh()
-        elif action == add_action:
-            self.repo.stage([status.path])
-            self.refresh()
-        elif action == ignore_action:
-            self.repo.ignore([status.path])
-            self.refresh()
-        elif action == diff_action:
-            self._display_diff(status.path)
+    def _ignore_targets(self) -> None:
+        paths = [t.path for t in self._ctx_targets if t.status == '??']
+        self._change_index(self.repo.ignore, paths)
+
+    def _diff_target(self) -> None:
+        if self._ctx_status is not None:
+            self._display_diff(self._ctx_status)
+
+    def _change_index(self, fn: Callable[[List[str]], None], paths: List[str]) -> None:
+        self._run_git(fn, paths, on_done=lambda _result: self.refresh())
+
+    def _after_history_change(self, _result: Any = None) -> None:
+        self.refresh()
 
     def commit(self) -> None:
+        """Commit what is already staged in the index."""
+        message = self._commit_message()
+        if not message:
+            return
+        repo = self.repo
+
+        # checked on the worker against the index itself; the status list
+        # may predate a stage still in flight or a `git add` from a terminal
+        def commit_staged() -> bool:
+            if not repo.has_staged_changes():
+                return False
+            repo.commit(message)
+            return True
+
+        def done(committed: bool) -> None:
+            if committed:
+                self._after_commit(None)
+            else:
+                QMessageBox.warning(self, "Warning", "No changes staged for commit")
+
+        self._run_git(commit_staged, on_done=done)
+
+    def commit_all(self) -> None:
+        """Stage every listed file, then commit."""
+        message = self._commit_message()
+        if not message:
+            return
+        paths = self.status_model.paths
+        repo = self.repo
+
+        def stage_and_commit() -> None:
+            repo.stage(paths)
+            repo.commit(message)
+
+        self._run_git(stage_and_commit, on_done=self._after_commit)
+
+    def _commit_message(self) -> str:
         message = self.commit_msg.toPlainText().strip()
         if not message:
             QMessageBox.warning(self, "Warning", "Commit message is empty")
-            return
-        paths = [s.path for s in self.status_model.statuses]
-        self.repo.stage(paths)
-        self.repo.commit(message)
+        return message
+
+    def _after_commit(self, _result: None) -> None:
         self.commit_msg.clear()
-        self.refresh()
+        self._after_history_change()
 
     def pull(self) -> None:
-        self.repo.pull()
-        self.refresh()
+        self._run_git(self.repo.pull, on_done=self._after_history_change)
 
     def push(self) -> None:
-        self.repo.push()
-        self.refresh()
+        self._run_git(self.repo.push, on_done=self._after_history_change)
 
     def push_review(self) -> None:
-        review = self.repo.push_review()
+        self._run_git(self.repo.push_review, on_done=self._show_push_review)
+
+    def _show_push_review(self, review: str) -> None:
         if not review.strip():
             review = 'No commits to push'
         QMessageBox.information(self, 'Push Review', review)
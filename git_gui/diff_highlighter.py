@@ -1,23 +1,49 @@
 from PyQt6.QtGui import QSyntaxHighlighter, QTextCharFormat, QColor
-from PyQt6.QtCore import Qt, QRegularExpression
+
+
+# first character -> (line kind, required prefix, excluded prefix)
+LINE_RULES = {
+    '+': ('add', '+', '+++'),
+    '-': ('remove', '-', '---'),
+    '@': ('header', '@@', None),
+    'd': ('header', 'diff', None),
+    'i': ('header', 'index', None),
+}
 
 
 class DiffHighlighter(QSyntaxHighlighter):
     """Simple syntax highlighter for git diff output."""
 
+    # formats and dispatch table shared by every instance; built on first use
+    _dispatch_table = None
+
     def __init__(self, parent):
         super().__init__(parent)
-        self.add_format = QTextCharFormat()
-        self.add_format.setForeground(QColor('darkgreen'))
-        self.remove_format = QTextCharFormat()
-        self.remove_format.setForeground(QColor('red'))
-        self.header_format = QTextCharFormat()
-        self.header_format.setForeground(QColor('blue'))
+        self._dispatch = self._shared_dispatch()
+
+    @classmethod
+    def _shared_dispatch(cls):
+        if cls._dispatch_table is None:
+            formats = {}
+            for kind, color in (('add', 'darkgreen'), ('remove', 'red'), ('header', 'blue')):
+                fmt = QTextCharFormat()
+                fmt.setForeground(QColor(color))
+                formats[kind] = fmt
+            cls._dispatch_table = {
+                first: (formats[kind], required, excluded)
+                for first, (kind, required, excluded) in LINE_RULES.items()
+            }
+        return cls._dispatch_table
 
     def highlightBlock(self, text: str) -> None:  # type: ignore[override]
-        if text.startswith('+') and not text.startswith('+++'):
-            self.setFormat(0, len(text), self.add_format)
-        elif text.startswith('-') and not text.startswith('---'):
-            self.setFormat(0, len(text), self.remove_format)
-        elif text.startswith('@@') or text.startswith('diff') or text.startswith('index'):
-            self.setFormat(0, len(text), self.header_format)
+        if not text:
+            return
+        entry = self._dispatch.get(text[0])
+        if entry is None:
+            return
+        fmt, required, excluded = entry
+        if len(required) > 1 and not text.startswith(required):
+            return
+        if excluded is not None and text.startswith(excluded):
+            return
+        self.setFormat(0, len(text), fmt)
@@ -1,8 +1,19 @@
+import asyncio
+import mmap
 import os
+import re
+import subprocess
+import threading
+import time
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
-from git import Repo, GitCommandError
+from git import Head, Repo, GitCommandError
+from git.config import GitConfigParser
+from git.index import IndexFile
+
+from . import _index
+from ._untracked import UntrackedCache, is_racy, stat_token
 
 
 @dataclass
@@ -10,9 +21,197 @@ class FileStatus:
     path: str
     status: str
 
+# ``git diff --name-status`` letter -> status code; an unmerged path is
+# reported by both diffs and combines to 'UU' like ``git status`` shows it
+_STAGED_CODE = {'A': 'A ', 'D': 'D ', 'R': 'R ', 'M': 'M ', 'U': 'U '}
+_UNSTAGED_CODE = {'A': ' A', 'D': ' D', 'R': ' R', 'M': ' M', 'U': ' U'}
+_DEFAULT_STAGED = 'M '
+_DEFAULT_UNSTAGED = ' M'
+
+# argv prefix of the git processes spawned directly; all of them only read
+_GIT_PREFIX = ('git', '--no-pager', '--no-optional-locks')
+
+
+def _git_env(**extra: str) -> dict:
+    """Return the environment for a directly spawned git process.
+
+    The C locale spares git locale handling; a locale set by the user
+    still wins.
+    """
+    return {'LC_ALL': 'C', **os.environ, **extra}
+
+
+#: git log format shared by every commit listing: abbreviated hash and subject
+_LOG_FORMAT = '--format=%h %s'
+
+
+def _parse_log(output: bytes) -> List[Tuple[str, str]]:
+    """Split ``git log -z`` output in :data:`_LOG_FORMAT` into (sha, summary)."""
+    entries = []
+    for record in output.decode('utf-8', 'replace').split('\0'):
+        sha, _, summary = record.partition(' ')
+        if sha:
+            entries.append((sha, summary))
+    return entries
+
+
+# start of each file's section in ``git diff -p`` output
+_PATCH_START = re.compile(rb'^(?=diff --git |diff --cc |\* Unmerged path )', re.M)
+
+
+def _split_patches(output: bytes) -> Optional[Dict[str, str]]:
+    """Map each path of ``git diff --raw -p -z`` output to its patch text.
+
+    Sections are matched to paths through the raw records, which list the
+    files in patch order with unambiguous NUL-terminated names. Returns
+    None if the two do not line up.
+    """
+    raw, _, patch = output.partition(b'\0\0')
+    fields = raw.split(b'\0')
+    paths = []
+    i = 0
+    while i < len(fields) and fields[i]:
+        # ":<modes> <shas> <status>" then one path, two for renames/copies
+        i += 3 if fields[i].rsplit(b' ', 1)[-1][:1] in (b'R', b'C') else 2
+        paths.append(fields[i - 1].decode('utf-8', 'surrogateescape'))
+    sections = _PATCH_START.split(patch)[1:]
+    if len(sections) != len(paths):
+        return None
+    return {
+        path: section.decode('utf-8', 'replace')
+        for path, section in zip(paths, sections)
+    }
+
+
+def _parse_name_status(output: bytes) -> List[Tuple[str, str]]:
+    """Split ``git diff --name-status -z`` output into (letter, path) pairs.
+
+    Renames and copies are reported under their destination path.
+    """
+    fields = output.decode('utf-8', 'surrogateescape').split('\0')
+    changes = []
+    i = 0
+    while i < len(fields) and fields[i]:
+        letter = fields[i][0]
+        i += 3 if letter in 'RC' else 2
+        changes.append((letter, fields[i - 1]))
+    return changes
+
+
+def _prefix_pathspec(prefix: str) -> str:
+    """Return a git pathspec matching exactly the paths starting with *prefix*."""
+    escaped = ''.join('\\' + c if c in '*?[\\' else c for c in prefix)
+    # without glob magic '*' also matches '/'; ':(top)' keeps a leading ':'
+    # in *prefix* from being read as magic
+    return f':(top){escaped}*'
+
+
+def _format_log(entries: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"{sha} {summary}" for sha, summary in entries)
+
+
+@dataclass
+class RepositoryState:
+    """Everything the main window shows, as read by :meth:`Repository.refresh`."""
+
+    statuses: List[FileStatus]
+    log: str
+    branches: List[str]
+    current_branch: str
+
+
+class _CheckIgnore:
+    """Long-lived ``git check-ignore --stdin`` process.
+
+    Batches of paths are answered over a pipe instead of spawning git for
+    each one. git loads ignore files lazily and keeps them, so callers pass
+    ``restart=True`` when ignore files may have changed.
+    """
+
+    def __init__(self, cwd: str) -> None:
+        self.cwd = cwd
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def query(self, paths: List[str], restart: bool = False) -> Set[str]:
+        """Return the subset of *paths* matched by ignore rules."""
+        if not paths:
+            return set()
+        with self._lock:
+            if restart:
+                self._stop()
+            proc = self._start()
+            # write from a thread so a full stdout pipe cannot deadlock us
+            payload = b''.join(os.fsencode(p) + b'\0' for p in paths)
+            writer = threading.Thread(target=self._write, args=(proc, payload), daemon=True)
+            writer.start()
+            try:
+                output = self._read(proc, 4 * len(paths))
+            finally:
+                writer.join()
+        # -v -n -z: source, line number, pattern and path for every input;
+        # the source is empty for paths that no pattern matched
+        fields = output.split(b'\0')
+        return {
+            path
+            for path, source, pattern in zip(paths, fields[0::4], fields[2::4])
+            if source and not pattern.startswith(b'!')
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop()
+
+    def _start(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                [*_GIT_PREFIX, 'check-ignore', '--no-index', '--stdin', '-z', '-v', '-n'],
+                cwd=self.cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=_git_env(GIT_FLUSH='1'),
+            )
+        return self._proc
+
+    def _stop(self) -> None:
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.stdout.close()
+            self._proc.wait()
+            self._proc = None
+
+    @staticmethod
+    def _write(proc: subprocess.Popen, payload: bytes) -> None:
+        try:
+            proc.stdin.write(payload)
+            proc.stdin.flush()
+        except OSError:
+            pass  # the reader notices the process went away
+
+    def _read(self, proc: subprocess.Popen, fields: int) -> bytes:
+        chunks: List[bytes] = []
+        while fields > 0:
+            data = proc.stdout.read1(65536)
+            if not data:
+                self._stop()
+                raise GitCommandError(['git', 'check-ignore'], proc.wait())
+            fields -= data.count(b'\0')
+            chunks.append(data)
+        return b''.join(chunks)
+
+
 class Repository:
     """Wrapper around git operations using GitPython."""
 
+    #: seconds a status() result is reused when nothing was changed through
+    #: this object; bounds how stale edits made outside the GUI can appear
+    STATUS_TTL = 1.0
+
+    #: seconds refresh() waits for git before giving up, so a stuck git
+    #: process cannot stall the GUI indefinitely
+    REFRESH_TIMEOUT = 30.0
+
     def __init__(self, path: str) -> None:
         self.path = os.path.abspath(path)
         try:
@@ -21,74 +220,375 @@ class Repository:
             raise ValueError(f"{path} is not a git repository") from exc
         if self.repo.bare:
             raise ValueError(f"{path} is not a git repository")
+        # memoized reads, dropped by the operations that can change them
+        # (stat token, value) pairs; see current_branch() and branches()
+        self._branch_cache: Optional[Tuple[object, str]] = None
+        self._heads_cache: Optional[Tuple[object, Dict[str, Head]]] = None
+        self._log_cache: Optional[Tuple[int, List[Tuple[str, str]]]] = None
+        # cached flag -> (key, {path: (stat token, patch)} or None); see diff()
+        self._diff_cache: Dict[bool, Tuple[object, Optional[Dict[str, Tuple[object, str]]]]] = {}
+        self._status_cache: Optional[Tuple[float, List[FileStatus]]] = None
+        self._status_lock = threading.Lock()
+        self._config: Optional[GitConfigParser] = None
+        # (stat token of the repository config file, remote names)
+        self._config_path = os.path.join(self.repo.common_dir, 'config')
+        self._remote_names: Optional[Tuple[object, Set[str]]] = None
+        # GitPython IndexFile reused while .git/index keeps this stat token
+        self._index_path = os.path.join(self.repo.git_dir, 'index')
+        self._index_pin: Optional[Tuple[object, IndexFile]] = None
+        # (stat token of .git/index, (tracked paths, gitlink paths)) or None
+        # for an index format _index cannot read
+        self._tracked_cache: Optional[Tuple[object, Optional[Tuple[Set[str], Set[str]]]]] = None
+        object_format = self._config_reader().get_value(
+            'extensions', 'objectformat', 'sha1'
+        )
+        self._hash_size = 32 if object_format == 'sha256' else 20
+        self._untracked = UntrackedCache(
+            self.path,
+            os.path.join(self.repo.git_dir, 'gitgui_untracked_cache.json.gz'),
+            self._exclude_files(),
+        )
+        self._check_ignore = _CheckIgnore(self.path)
+
+    def close(self) -> None:
+        """Stop helper processes owned by this object."""
+        self._check_ignore.close()
+        self.repo.close()
+
+    def invalidate(self) -> None:
+        """Drop cached repository state so the next reads go to git.
+
+        Use this when the repository may have been changed outside this
+        object, e.g. from a terminal.
+        """
+        self._branch_cache = None
+        self._heads_cache = None
+        self._log_cache = None
+        self._status_cache = None
+        self._diff_cache.clear()
+        self._index_pin = None
+        self._tracked_cache = None
+        self._config = None
+        self._remote_names = None
+
+    def _config_reader(self) -> GitConfigParser:
+        """Return a config reader shared until :meth:`invalidate`."""
+        if self._config is None:
+            self._config = self.repo.config_reader()
+        return self._config
+
+    def _remotes(self) -> Set[str]:
+        """Return the configured remote names.
+
+        Read from the ``[remote "name"]`` sections of the repository config,
+        as ``Repo.remotes`` does, so no GitPython ``Remote`` objects are
+        built. Cached while that file keeps its stat token, so remotes added
+        from a terminal are seen.
+        """
+        token = stat_token(self._config_path)
+        cached = self._remote_names
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        names = set()
+        for section in self.repo.config_reader('repository').sections():
+            if section.startswith('remote "') and section.endswith('"'):
+                names.add(section[8:-1])
+        self._remote_names = None if is_racy(token) else (token, names)
+        return names
+
+    def _git_index(self) -> IndexFile:
+        """Return a GitPython index, reused while ``.git/index`` is unchanged.
+
+        ``Repo.index`` builds a new IndexFile on every access, which then
+        parses the whole index in Python before add, reset or commit.
+        """
+        token = stat_token(self._index_path)
+        if self._index_pin is None or self._index_pin[0] != token:
+            self._index_pin = (token, self.repo.index)
+        return self._index_pin[1]
+
+    def _index_written(self) -> None:
+        """Adopt the index the pinned IndexFile has just written itself."""
+        if self._index_pin is not None:
+            self._index_pin = (stat_token(self._index_path), self._index_pin[1])
+
+    async def refresh(self, max_count: int = 20) -> RepositoryState:
+        """Read status, log and branches concurrently.
+
+        Status is computed on a thread while the log, unless cached, is read
+        by a concurrent git process. Raises
+        :class:`asyncio.TimeoutError` after :attr:`REFRESH_TIMEOUT` seconds.
+        """
+        # branch names come from cheap file reads, so only the status and
+        # the log are worth overlapping
+        current = self.current_branch()
+        branches = self.branches()
+        log_cached = self._log_cache is not None and self._log_cache[0] == max_count
+        queries = {'status': asyncio.to_thread(self.status)}
+        if not log_cached and self.head_sha():
+            queries['log'] = self._git_output(
+                'log', '-z', f'--max-count={max_count}', _LOG_FORMAT
+            )
+        results = dict(zip(queries, await asyncio.wait_for(
+            asyncio.gather(*queries.values()), self.REFRESH_TIMEOUT
+        )))
+
+        if not log_cached:
+            self._log_cache = (max_count, _parse_log(results.get('log', b'')))
+        return RepositoryState(
+            statuses=results['status'],
+            log=_format_log(self._log_cache[1]),
+            branches=branches,
+            current_branch=current,
+        )
+
+    async def _git_output(self, *args: str) -> bytes:
+        """Run git with *args* and return its standard output."""
+        proc = await asyncio.create_subprocess_exec(
+            *_GIT_PREFIX, *args,
+            cwd=self.path,
+            env=_git_env(),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            # timed out or a sibling query failed; do not leave git running
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode:
+            raise GitCommandError(['git', *args], proc.returncode, stderr)
+        return stdout
+
+    def status(
+        self, include_untracked: bool = True, prefix: str = ''
+    ) -> List[FileStatus]:
+        """Return status of repository files.
+
+        Staged and unstaged changes come from ``git diff --name-status``,
+        which checks the index stat data in git itself; untracked files come
+        from a walk of the working tree against the paths in ``.git/index``.
+
+        Results are reused for :attr:`STATUS_TTL` seconds unless an operation
+        on this object changed the index or working tree in the meantime.
+        With ``include_untracked=False`` the untracked file walk is skipped.
+        A *prefix* limits the result to paths starting with it; git and the
+        index scan only look at those paths.
+        """
+        # one computation at a time: a caller arriving while another thread
+        # computes waits for that result instead of walking the tree again
+        with self._status_lock:
+            cached = self._status_cache
+            if cached is not None and time.monotonic() - cached[0] < self.STATUS_TTL:
+                return [
+                    s for s in cached[1]
+                    if s.path.startswith(prefix) and (include_untracked or s.status != '??')
+                ]
+            statuses = self._compute_status(include_untracked, prefix)
+            if include_untracked and not prefix:
+                self._status_cache = (time.monotonic(), statuses)
+        return list(statuses)
+
+    def _compute_status(
+        self, include_untracked: bool = True, prefix: str = ''
+    ) -> List[FileStatus]:
+        tracked = self._tracked_paths() if include_untracked else None
+        if include_untracked and tracked is None:
+            return self._porcelain_status(include_untracked, prefix)
+        paths = [_prefix_pathspec(prefix)] if prefix else []
 
-    def status(self) -> List[FileStatus]:
-        """Return status of repository files using GitPython objects."""
         statuses: List[FileStatus] = []
 
         # staged changes compared to HEAD
-        for diff in self.repo.index.diff('HEAD'):
-            path = diff.b_path or diff.a_path
-            code = diff.change_type
-            status = {
-                'A': 'A ',
-                'D': 'D ',
-                'R': 'R ',
-                'M': 'M ',
-            }.get(code, 'M ')
+        staged_code = _STAGED_CODE.get
+        for letter, path in self._name_status('--cached', '-M', '--', *paths):
+            status = staged_code(letter, _DEFAULT_STAGED)
             statuses.append(FileStatus(path=path, status=status))
 
-        # unstaged changes in working tree
-        staged_paths = {s.path for s in statuses}
-        for diff in self.repo.index.diff(None):
-            path = diff.b_path or diff.a_path
-            code = diff.change_type
-            status = {
-                'A': ' A',
-                'D': ' D',
-                'R': ' R',
-                'M': ' M',
-            }.get(code, ' M')
-            if path in staged_paths:
-                for s in statuses:
-                    if s.path == path:
-                        s.status = s.status[0] + status[1]
-                        break
+        # unstaged changes in working tree; git skips files whose stat data
+        # still matches the index and only reads the others
+        by_path = {s.path: s for s in statuses}
+        unstaged_code = _UNSTAGED_CODE.get
+        for letter, path in self._name_status('--', *paths):
+            status = unstaged_code(letter, _DEFAULT_UNSTAGED)
+            existing = by_path.get(path)
+            if existing is not None:
+                # git follows the 'U' of an unmerged path with its diff
+                # against our side; the path stays 'UU'
+                if existing.status != 'UU':
+                    existing.status = existing.status[0] + status[1]
             else:
-                statuses.append(FileStatus(path=path, status=status))
+                entry = FileStatus(path=path, status=status)
+                statuses.append(entry)
+                by_path[path] = entry
+
+        # untracked files; directories unchanged since the last walk are
+        # answered from the untracked cache
+        if tracked is not None:
+            untracked = self._untracked.untracked(
+                tracked[0], tracked[1], self._check_ignore.query, prefix
+            )
+            for path in untracked:
+                statuses.append(FileStatus(path=path, status='??'))
 
-        # untracked files
-        for path in self.repo.untracked_files:
-            statuses.append(FileStatus(path=path, status='??'))
+        return statuses
 
+    def _tracked_paths(self) -> Optional[Tuple[Set[str], Set[str]]]:
+        """Return the tracked and gitlink paths recorded in ``.git/index``.
+
+        Reused while the index keeps its stat token. None means the index
+        format is one :mod:`._index` cannot read.
+        """
+        token = stat_token(self._index_path)
+        cached = self._tracked_cache
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        entries = _index.read_index(self._index_path, self._hash_size)
+        tracked = None
+        if entries is not None:
+            tracked = (
+                {entry.path for entry in entries},
+                {e.path for e in entries if _index.is_gitlink(e)},
+            )
+        self._tracked_cache = None if is_racy(token) else (token, tracked)
+        return tracked
+
+    def _name_status(self, *args: str) -> List[Tuple[str, str]]:
+        """Run ``git diff --name-status -z`` with *args* and parse it.
+
+        GitPython's own diff parsing splits raw records on ':' and fails
+        for paths containing one.
+        """
+        output = self.repo.git.diff('--name-status', '-z', *args, stdout_as_string=False)
+        return _parse_name_status(output)
+
+    def _porcelain_status(
+        self, include_untracked: bool = True, prefix: str = ''
+    ) -> List[FileStatus]:
+        """Return status from a single ``git status --porcelain=v2`` call.
+
+        Used for index formats :mod:`._index` cannot read. ``-z`` output
+        needs no unquoting, and optional locks and ahead/behind counting
+        are skipped since only the file entries are used.
+        """
+        proc = subprocess.run(
+            [
+                *_GIT_PREFIX, 'status', '--porcelain=v2', '-z',
+                '--no-ahead-behind',
+                '--untracked-files=all' if include_untracked else '--untracked-files=no',
+                '--',
+                *([_prefix_pathspec(prefix)] if prefix else []),
+            ],
+            cwd=self.path,
+            env=_git_env(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if proc.returncode:
+            raise GitCommandError(['git', 'status'], proc.returncode, proc.stderr)
+        statuses: List[FileStatus] = []
+        records = iter(proc.stdout.split(b'\0'))
+        for record in records:
+            kind = record[:1]
+            if kind == b'?':
+                statuses.append(FileStatus(path=os.fsdecode(record[2:]), status='??'))
+                continue
+            if kind == b'1':
+                # 1 XY sub mH mI mW hH hI path
+                fields = record.split(b' ', 8)
+            elif kind == b'2':
+                # 2 XY sub mH mI mW hH hI Xscore path, then the original path
+                fields = record.split(b' ', 9)
+                next(records, None)
+            elif kind == b'u':
+                # u XY sub m1 m2 m3 mW h1 h2 h3 path
+                fields = record.split(b' ', 10)
+            else:
+                continue  # headers and ignored entries
+            code = fields[1].decode('ascii').replace('.', ' ')
+            statuses.append(FileStatus(path=os.fsdecode(fields[-1]), status=code))
         return statuses
 
+    def _exclude_files(self) -> List[str]:
+        """Return the ignore files that apply to the whole repository."""
+        files = [os.path.join(self.repo.common_dir, 'info', 'exclude')]
+        excludes = self._config_reader().get_value('core', 'excludesfile', '')
+        if excludes:
+            files.append(os.path.expanduser(str(excludes)))
+        else:
+            config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+            files.append(os.path.join(config_home, 'git', 'ignore'))
+        return files
+
     def ignore(self, files: List[str]) -> None:
         """Add files to .gitignore and stage the file."""
         if not files:
             return
         gitignore_path = os.path.join(self.path, '.gitignore')
-        existing: List[str] = []
-        if os.path.exists(gitignore_path):
-            with open(gitignore_path, 'r', encoding='utf-8') as fh:
-                existing = [line.strip() for line in fh if line.strip()]
-        with open(gitignore_path, 'a', encoding='utf-8') as fh:
-            for f in files:
-                if f not in existing:
-                    fh.write(f + '\n')
+        with open(gitignore_path, 'a+', encoding='utf-8') as fh:
+            fh.seek(0)
+            content = fh.read()
+            existing = {line.strip() for line in content.splitlines()}
+            # dict.fromkeys drops repeated arguments but keeps their order
+            to_add = list(dict.fromkeys(f for f in files if f not in existing))
+            if to_add:
+                # never glue the first new pattern onto an unterminated line
+                prefix = '\n' if content and not content.endswith('\n') else ''
+                fh.write(prefix + '\n'.join(to_add) + '\n')
         # stage the .gitignore so it does not appear as untracked
-        self.repo.index.add([gitignore_path])
+        index = self._git_index()
+        if to_add or ('.gitignore', 0) not in index.entries:
+            index.add([gitignore_path])
+            self._index_written()
+            self._status_cache = None
 
     def stage(self, files: List[str]) -> None:
-        if files:
-            self.repo.index.add(files)
+        """Stage *files*, including the deletion of files that are gone."""
+        if not files:
+            return
+        # IndexFile.add() raises for a missing file; deletions go through
+        # `git rm --cached` with literal pathspecs instead
+        deleted = [f for f in files if not os.path.lexists(os.path.join(self.path, f))]
+        if len(deleted) < len(files):
+            gone = set(deleted)
+            self._git_index().add([f for f in files if f not in gone])
+            self._index_written()
+        if deleted:
+            self.repo.git.rm(
+                '--cached', '--quiet', '--ignore-unmatch', '--',
+                *[':(literal)' + path for path in deleted],
+            )
+        self._status_cache = None
+        self._diff_cache.clear()
 
     def unstage(self, files: List[str]) -> None:
         if files:
-            self.repo.index.reset(files)
+            self._git_index().reset(paths=files)
+            self._index_written()
+            self._status_cache = None
+            self._diff_cache.clear()
+
+    def has_staged_changes(self) -> bool:
+        """Return True if the index differs from HEAD.
+
+        Asks git rather than the last status, so changes staged from
+        elsewhere count too.
+        """
+        try:
+            self.repo.git.diff('--cached', '--quiet', '--')
+        except GitCommandError as exc:
+            if exc.status == 1:
+                return True
+            raise
+        return False
 
     def commit(self, message: str) -> None:
-        self.repo.index.commit(message)
+        self._git_index().commit(message)
+        self._log_cache = None
+        self._status_cache = None
+        self._diff_cache.clear()
 
     def pull(self, remote: str = 'origin', branch: Optional[str] = None) -> None:
         remote_obj = self.repo.remotes[remote]
@@ -96,6 +596,8 @@ class Repository:
             remote_obj.pull(branch)
         else:
             remote_obj.pull()
+        self._log_cache = None
+        self._status_cache = None
 
     def push(self, remote: str = 'origin', branch: Optional[str] = None) -> None:
         remote_obj = self.repo.remotes[remote]
@@ -103,44 +605,153 @@ class Repository:
             remote_obj.push(branch)
         else:
             remote_obj.push()
+        self._log_cache = None
+        self._status_cache = None
 
     def log(self, max_count: int = 20) -> str:
-        commits = list(self.repo.iter_commits(max_count=max_count))
-        return "\n".join(f"{c.hexsha[:7]} {c.summary}" for c in commits)
+        return _format_log(self.log_entries(max_count))
+
+    def log_entries(self, max_count: int = 20) -> List[Tuple[str, str]]:
+        """Return (abbreviated sha, summary) pairs for the latest commits."""
+        if self._log_cache is None or self._log_cache[0] != max_count:
+            entries = self._log(f'--max-count={max_count}') if self.head_sha() else []
+            self._log_cache = (max_count, entries)
+        return list(self._log_cache[1])
+
+    def _log(self, *args: str) -> List[Tuple[str, str]]:
+        """Run ``git log`` with *args*, asking only for the displayed fields."""
+        output = self.repo.git.log('-z', _LOG_FORMAT, *args, stdout_as_string=False)
+        return _parse_log(output)
+
+    def head_sha(self) -> str:
+        """Return the commit SHA HEAD points to, or an empty string if unborn."""
+        if not self.repo.head.is_valid():
+            return ''
+        return self.repo.head.commit.hexsha
 
     def current_branch(self) -> str:
-        """Return the name of the current branch."""
-        return self.repo.active_branch.name
+        """Return the name of the current branch.
+
+        ``HEAD`` is read directly and the result is reused while its stat
+        data is unchanged, so a checkout made outside the GUI is noticed.
+        """
+        head_path = os.path.join(self.repo.git_dir, 'HEAD')
+        token = stat_token(head_path)
+        cached = self._branch_cache
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        with open(head_path, 'rb') as fh:
+            head = fh.read().strip()
+        if not head.startswith(b'ref: refs/heads/'):
+            raise TypeError("HEAD is detached and does not point to a branch")
+        name = os.fsdecode(head[len(b'ref: refs/heads/'):])
+        self._branch_cache = None if is_racy(token) else (token, name)
+        return name
 
     def push_review(self, remote: str = 'origin', branch: Optional[str] = None) -> str:
         """Return commits that would be pushed to the remote."""
         if branch is None:
             branch = self.current_branch()
-        range_spec = f"{remote}/{branch}..HEAD"
-        commits = list(self.repo.iter_commits(range_spec))
-        return "\n".join(f"{c.hexsha[:7]} {c.summary}" for c in commits)
+        return _format_log(self._log(f"{remote}/{branch}..HEAD", '--'))
 
     def diff(self, path: str, cached: bool = False) -> str:
-        """Return diff for a given file."""
+        """Return diff for a given file.
+
+        One whole-tree ``git diff`` is run and split per file; later calls
+        are answered from it while ``.git/index`` (and for *cached*, HEAD)
+        is unchanged. A worktree patch is only reused while the file keeps
+        its stat data; otherwise, or for files that had no changes, the
+        file is diffed on its own.
+        """
+        key = (stat_token(self._index_path), self.head_sha() if cached else None)
+        cached_patches = self._diff_cache.get(cached)
+        if cached_patches is None or cached_patches[0] != key:
+            cached_patches = (key, self._diff_patches(cached))
+            self._diff_cache[cached] = cached_patches
+        patches = cached_patches[1]
+        if patches is not None:
+            entry = patches.get(path)
+            if cached:
+                return entry[1] if entry is not None else ''
+            if entry is not None and entry[0] is not None:
+                if entry[0] == stat_token(os.path.join(self.path, path)):
+                    return entry[1]
+        args = ['--no-color', '--no-ext-diff']
         if cached:
-            diffs = self.repo.index.diff('HEAD', paths=[path], create_patch=True)
-        else:
-            diffs = self.repo.index.diff(None, paths=[path], create_patch=True)
-        parts = []
-        for d in diffs:
-            content = d.diff
-            if isinstance(content, bytes):
-                content = content.decode('utf-8', errors='replace')
-            parts.append(content)
-        return "".join(parts)
+            args.append('--cached')
+        output = self.repo.git.diff(
+            *args, '--', ':(literal)' + path, stdout_as_string=False
+        )
+        return output.decode('utf-8', 'replace')
+
+    def _diff_patches(self, cached: bool) -> Optional[Dict[str, Tuple[object, str]]]:
+        """Run one whole-tree diff and return ``{path: (stat token, patch)}``.
+
+        Worktree patches record the file's stat token, or None when the
+        file may have changed while git was reading it.
+        """
+        args = ['--no-color', '--no-ext-diff', '--raw', '-p', '-z']
+        if cached:
+            args.append('--cached')
+        started = time.time_ns()
+        output = self.repo.git.diff(*args, stdout_as_string=False)
+        split = _split_patches(output)
+        if split is None:
+            return None
+        patches: Dict[str, Tuple[object, str]] = {}
+        for path, patch in split.items():
+            token = None
+            if not cached:
+                token = stat_token(os.path.join(self.path, path))
+                if is_racy(token, started):
+                    token = None
+            patches[path] = (token, patch)
+        return patches
 
     def branches(self) -> List[str]:
-        """Return a list of branch names."""
-        return [head.name for head in self.repo.heads]
+        """Return a list of branch names.
+
+        The list is reused while ``packed-refs`` and the ``refs/heads``
+        directories keep their stat data; creating or deleting a branch
+        always changes one of them.
+        """
+        return list(self._heads())
+
+    def _heads(self) -> Dict[str, Head]:
+        """Return branch heads by name, cached like :meth:`branches`."""
+        tokens = self._heads_tokens()
+        cached = self._heads_cache
+        if cached is not None and cached[0] == tokens:
+            return cached[1]
+        heads = {head.name: head for head in self.repo.heads}
+        racy = any(is_racy(token) for _, token in tokens)
+        self._heads_cache = None if racy else (tokens, heads)
+        return heads
+
+    def _heads_tokens(self) -> List[Tuple[str, object]]:
+        common_dir = self.repo.common_dir
+        packed = os.path.join(common_dir, 'packed-refs')
+        tokens = [(packed, stat_token(packed))]
+        pending = [os.path.join(common_dir, 'refs', 'heads')]
+        while pending:
+            path = pending.pop()
+            tokens.append((path, stat_token(path)))
+            try:
+                with os.scandir(path) as it:
+                    pending.extend(e.path for e in it if e.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+        return tokens
 
     def checkout(self, branch: str) -> None:
         """Switch to the given branch."""
-        self.repo.heads[branch].checkout()
+        head = self._heads().get(branch)
+        if head is None:
+            raise IndexError(f"No branch named {branch!r}")
+        head.checkout()
+        self._log_cache = None
+        self._status_cache = None
+        self._diff_cache.clear()
 
     # ------------------------------------------------------------------
     # Repository management helpers
@@ -159,14 +770,17 @@ class Repository:
 
     def add_remote(self, name: str, url: str) -> None:
         """Add a remote if it does not already exist."""
-        if name not in [r.name for r in self.repo.remotes]:
+        if name not in self._remotes():
             self.repo.create_remote(name, url)
+            self._config = None
+            self._remote_names = None
 
     def configure_user(self, name: str, email: str) -> None:
         """Set the repository user name and email."""
         with self.repo.config_writer() as cw:
             cw.set_value("user", "name", name)
             cw.set_value("user", "email", email)
+        self._config = None
 
     # ------------------------------------------------------------------
     # Branching helpers
@@ -183,13 +797,30 @@ class Repository:
         """Delete a branch by name."""
         self.repo.delete_head(name, force=force)
 
-    def reflog(self) -> str:
-        """Return the repository reflog."""
+    def reflog(self, max_lines: int = 200) -> str:
+        """Return the last *max_lines* entries of the repository reflog.
+
+        The reflog only ever grows, so it is mapped and scanned backwards
+        from the end rather than read as a whole.
+        """
         log_path = os.path.join(self.repo.git_dir, 'logs', 'HEAD')
-        if os.path.exists(log_path):
-            with open(log_path, 'r', encoding='utf-8') as fh:
-                return fh.read()
-        return ''
+        try:
+            fh = open(log_path, 'rb')
+        except FileNotFoundError:
+            return ''
+        with fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size == 0:
+                return ''
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # the final newline terminates the last entry, not a line
+                pos = size - 1 if mm[size - 1] == 0x0A else size
+                for _ in range(max_lines):
+                    pos = mm.rfind(b'\n', 0, pos)
+                    if pos < 0:
+                        break
+                tail = mm[pos + 1:]
+        return tail.decode('utf-8')
 
     # ------------------------------------------------------------------
     # Tag helpers
@@ -208,6 +839,8 @@ class Repository:
     def checkout_tag(self, name: str) -> None:
         """Checkout a tag."""
         self.repo.tags[name].checkout()
+        self._log_cache = None
+        self._status_cache = None
 
     # ------------------------------------------------------------------
     # Submodule helpers
@@ -238,14 +871,20 @@ class Repository:
     # ------------------------------------------------------------------
     # Search helpers
 
-    def search_commits(self, pattern: str, author: Optional[str] = None) -> str:
-        """Search commits by message pattern and optionally by author."""
-        kwargs = {'grep': pattern}
+    def search_commits(
+        self, pattern: str, author: Optional[str] = None, max_count: Optional[int] = None
+    ) -> str:
+        """Search commits by message pattern and optionally by author.
+
+        With *max_count* git stops walking history after that many matches.
+        """
+        args = [f'--grep={pattern}']
         if author:
-            kwargs['author'] = author
-        commits = list(self.repo.iter_commits(**kwargs))
-        return "\n".join(f"{c.hexsha[:7]} {c.summary}" for c in commits)
+            args.append(f'--author={author}')
+        if max_count is not None:
+            args.append(f'--max-count={max_count}')
+        return _format_log(self._log(*args))
 
     def filter_statuses(self, path_filter: str) -> List[FileStatus]:
         """Filter status entries by path prefix."""
-        return [s for s in self.status() if s.path.startswith(path_filter)]
+        return self.status(prefix=path_filter)
@@ -1,40 +1,123 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Set
 from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt, QVariant
 
 from .git_backend import FileStatus
 
+# enum members resolved once; data() runs for every role of every painted row
+_DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+_USER_ROLE = Qt.ItemDataRole.UserRole
+
 class FileStatusModel(QAbstractListModel):
-    """Model to expose repository file status entries."""
+    """Model to expose repository file status entries.
+
+    Rows are stored as parallel lists of paths, status codes and display
+    strings; most consumers need only one of them, and ``FileStatus``
+    objects are built on demand.
+    """
 
     def __init__(self, statuses: List[FileStatus] | None = None) -> None:
         super().__init__()
-        self._statuses: List[FileStatus] = statuses or []
+        statuses = statuses or []
+        self._paths: List[str] = [s.path for s in statuses]
+        self._codes: List[str] = [s.status for s in statuses]
+        # DisplayRole strings, parallel to _paths
+        self._display: List[str] = [self._format(s.path, s.status) for s in statuses]
+        self._path_set: Set[str] = set(self._paths)
+
+    @staticmethod
+    def _format(path: str, code: str) -> str:
+        return f"{code}\t{path}"
 
-    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
-        if not index.isValid() or not (0 <= index.row() < len(self._statuses)):
+    def data(self, index: QModelIndex, role: int = _DISPLAY_ROLE):
+        # answer the roles Qt asks about but this model ignores (font,
+        # decoration, tooltip, ...) before looking at the index at all
+        if role != _DISPLAY_ROLE and role != _USER_ROLE:
             return QVariant()
-        status = self._statuses[index.row()]
-        if role == Qt.ItemDataRole.DisplayRole:
-            return f"{status.status}\t{status.path}"
-        if role == Qt.ItemDataRole.UserRole:
-            return status
-        return QVariant()
+        row = index.row()
+        if not index.isValid() or not (0 <= row < len(self._paths)):
+            return QVariant()
+        if role == _DISPLAY_ROLE:
+            return self._display[row]
+        return FileStatus(path=self._paths[row], status=self._codes[row])
 
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:  # type: ignore[override]
-        return len(self._statuses)
+        return len(self._paths)
 
     def update_statuses(self, statuses: List[FileStatus]) -> None:
-        self.beginResetModel()
-        self._statuses = list(statuses)
-        self.endResetModel()
+        """Apply *statuses*, emitting row signals only for actual changes.
+
+        Rows whose path disappeared are removed, rows whose status code
+        changed are reported through ``dataChanged`` and new paths are
+        appended, so unchanged rows keep their position and selection.
+        """
+        new_codes = {s.path: s.status for s in statuses}
+        if len(new_codes) != len(statuses):
+            # duplicate paths cannot be diffed by path; fall back to a reset
+            self.beginResetModel()
+            self._paths = [s.path for s in statuses]
+            self._codes = [s.status for s in statuses]
+            self._display = [self._format(s.path, s.status) for s in statuses]
+            self._path_set = set(self._paths)
+            self.endResetModel()
+            return
+
+        # remove vanished rows bottom-up in contiguous ranges
+        paths = self._paths
+        row = len(paths) - 1
+        while row >= 0:
+            if paths[row] in new_codes:
+                row -= 1
+                continue
+            last = row
+            while row >= 0 and paths[row] not in new_codes:
+                row -= 1
+            self.beginRemoveRows(QModelIndex(), row + 1, last)
+            del paths[row + 1:last + 1]
+            del self._codes[row + 1:last + 1]
+            del self._display[row + 1:last + 1]
+            self.endRemoveRows()
+
+        # refresh surviving rows and report changed codes per contiguous range
+        changed: List[int] = []
+        codes = self._codes
+        for row, path in enumerate(paths):
+            code = new_codes[path]
+            if code != codes[row]:
+                changed.append(row)
+                codes[row] = code
+                self._display[row] = self._format(path, code)
+        start = 0
+        while start < len(changed):
+            end = start
+            while end + 1 < len(changed) and changed[end + 1] == changed[end] + 1:
+                end += 1
+            self.dataChanged.emit(self.index(changed[start]), self.index(changed[end]))
+            start = end + 1
+
+        # append paths that were not shown before
+        added = [s for s in statuses if s.path not in self._path_set]
+        if added:
+            first = len(paths)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            paths.extend([s.path for s in added])
+            codes.extend([s.status for s in added])
+            self._display.extend([self._format(s.path, s.status) for s in added])
+            self.endInsertRows()
+
+        self._path_set = set(new_codes)
 
     @property
     def statuses(self) -> List[FileStatus]:
-        return list(self._statuses)
+        return [FileStatus(path=p, status=c) for p, c in zip(self._paths, self._codes)]
+
+    @property
+    def paths(self) -> List[str]:
+        return list(self._paths)
 
     def status_at(self, index: QModelIndex) -> FileStatus | None:
-        if not index.isValid() or not (0 <= index.row() < len(self._statuses)):
+        if not index.isValid() or not (0 <= index.row() < len(self._paths)):
             return None
-        return self._statuses[index.row()]
+        row = index.row()
+        return FileStatus(path=self._paths[row], status=self._codes[row])
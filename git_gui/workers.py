@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Optional
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    """Signals emitted by :class:`GitWorker` back to the GUI thread."""
+
+    finished = pyqtSignal(object, object)  # worker, result
+    failed = pyqtSignal(object, str)  # worker, error message
+
+
+class GitWorker(QRunnable):
+    """Run a blocking git call on a pool thread.
+
+    The result is delivered through ``signals.finished`` and any exception
+    through ``signals.failed``; ``on_done`` and ``on_failed`` are carried
+    along so the receiver knows how to apply the result or undo the UI
+    state that asked for it.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_failed: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.on_done = on_done
+        self.on_failed = on_failed
+        self.signals = WorkerSignals()
+
+    def run(self) -> None:
+        try:
+            result = self.fn(*self.args)
+        except Exception as exc:  # reported to the GUI instead of lost in the pool
+            self.signals.failed.emit(self, str(exc))
+            return
+        self.signals.finished.emit(self, result)
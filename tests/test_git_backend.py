@@ -1,96 +1,587 @@
+import asyncio
+import os
+import shutil
+import subprocess
 import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Optional, Tuple
+from unittest import mock
 
 from git import Repo
 from git_gui.git_backend import Repository
 
+# config for every git process the tests start: no fsync, gc or signing
+GIT_FAST_CONFIG = {
+    'core.fsync': 'none',
+    'core.fsyncObjectFiles': 'false',
+    'gc.auto': '0',
+    'commit.gpgsign': 'false',
+    'init.defaultBranch': 'master',
+}
+
+# no prompts, locale handling or optional index refreshes in helper git runs
+_GIT_ENV = {'GIT_TERMINAL_PROMPT': '0', 'LC_ALL': 'C', 'GIT_OPTIONAL_LOCKS': '0'}
+
+
+def _git(*args: str, cwd: Path) -> None:
+    """Run a git command for test setup, discarding its output."""
+    _run_quiet(('git', *args), cwd)
+
+
+def _git_script(script: str, cwd: Path) -> None:
+    """Run a chain of git commands through one shell, discarding output."""
+    _run_quiet(('sh', '-c', script), cwd)
+
+
+def _write_files(base: Path, files: Dict[str, bytes]) -> None:
+    """Write *files*, relative to *base*, through a single directory fd."""
+    dir_fd = os.open(base, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        for name, data in files.items():
+            fd = os.open(name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644, dir_fd=dir_fd)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _new_dir() -> Path:
+    """Return a new empty directory below the run's base directory."""
+    return Path(tempfile.mkdtemp(dir=_base_dir))
+
+
+def _run_quiet(argv: Tuple[str, ...], cwd: Path) -> None:
+    subprocess.run(
+        argv,
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env={**os.environ, **_GIT_ENV},
+    )
+
+
+# git instrumentation and config files the tests do without, unless the
+# environment already says otherwise (e.g. GIT_TRACE2 while debugging)
+GIT_QUIET_ENV = {
+    'GIT_TRACE': '0',
+    'GIT_TRACE2': '0',
+    'GIT_OPTIONAL_LOCKS': '0',
+    'GIT_CONFIG_SYSTEM': os.devnull,
+}
+
+# status entry of the untracked new.txt most status tests create
+_EXPECTED_NEW = ('new.txt', '??')
+
+# (file written, patterns passed to ignore(), expected status or None if
+# the file must not be listed); all cases share one repository
+_STATUS_CASES = [
+    ('new.txt', [], '??'),
+    ('file.txt', [], ' M'),
+    ('temp.log', ['temp.log'], None),
+    ('out/build.o', ['out/'], None),
+    ('notes/todo.txt', [], '??'),
+]
+
+_saved_tempdir: Optional[str] = None
+# one directory per run; test repositories are created inside it and
+# removed together in tearDownModule
+_base_dir: Optional[str] = None
+_saved_environ: Dict[str, Optional[str]] = {}
+
+
+def _set_environ(name: str, value: str) -> None:
+    _saved_environ.setdefault(name, os.environ.get(name))
+    os.environ[name] = value
+
+
+def setUpModule():
+    global _saved_tempdir, _base_dir
+    # keep test repositories in memory, unless TMPDIR says otherwise, and
+    # away from the user's git config
+    _saved_tempdir = tempfile.tempdir
+    if 'TMPDIR' not in os.environ and os.access('/dev/shm', os.W_OK | os.X_OK):
+        tempfile.tempdir = '/dev/shm'
+    _base_dir = tempfile.mkdtemp(prefix='git-gui-tests-')
+    _set_environ('GIT_CONFIG_GLOBAL', os.devnull)
+    for name, value in GIT_QUIET_ENV.items():
+        if name not in os.environ:
+            _set_environ(name, value)
+    # GIT_CONFIG_COUNT reaches git started by GitPython as well
+    _set_environ('GIT_CONFIG_COUNT', str(len(GIT_FAST_CONFIG)))
+    for i, (key, value) in enumerate(GIT_FAST_CONFIG.items()):
+        _set_environ(f'GIT_CONFIG_KEY_{i}', key)
+        _set_environ(f'GIT_CONFIG_VALUE_{i}', value)
+
+
+def tearDownModule():
+    global _base_dir
+    if _base_dir is not None:
+        shutil.rmtree(_base_dir, ignore_errors=True)
+        _base_dir = None
+    tempfile.tempdir = _saved_tempdir
+    for name, value in _saved_environ.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+    _saved_environ.clear()
+
+
 class TestRepository(unittest.TestCase):
-    def create_repo(self, directory: Path) -> Path:
-        repo = Repository.init(str(directory))
-        (directory / 'file.txt').write_text('hello')
-        repo.stage(['file.txt'])
-        repo.commit('init')
-        return directory
+    @classmethod
+    def setUpClass(cls):
+        # one committed repository, copied by every test that needs it
+        cls._template = _new_dir()
+        (cls._template / 'file.txt').write_text('hello')
+        _git_script(
+            'git init -q && git add file.txt && '
+            'git -c user.email=t@t -c user.name=t commit -qm init',
+            cls._template,
+        )
+
+    def create_repo(self, directory: Optional[Path] = None) -> Tuple[Path, Repository]:
+        """Copy the template repository to *directory* or a new directory.
+
+        Returns the path and a Repository for it, closed after the test.
+        """
+        if directory is None:
+            directory = _new_dir()
+        shutil.copytree(self._template, directory, dirs_exist_ok=True)
+        repo = Repository(str(directory))
+        self.addCleanup(repo.close)
+        return directory, repo
 
     def test_status(self):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            repo_path = Path(tmpdir)
-            self.create_repo(repo_path)
-            (repo_path / 'new.txt').write_text('new')
-            repo = Repository(str(repo_path))
-            statuses = repo.status()
-            self.assertTrue(any(s.path == 'new.txt' and s.status == '??' for s in statuses))
+        repo_path, repo = self.create_repo()
+        for directory in {str(Path(name).parent) for name, _, _ in _STATUS_CASES}:
+            (repo_path / directory).mkdir(parents=True, exist_ok=True)
+        _write_files(repo_path, {name: b'changed' for name, _, _ in _STATUS_CASES})
+        repo.ignore([pattern for _, patterns, _ in _STATUS_CASES for pattern in patterns])
+        statuses = {s.path: s.status for s in repo.status()}
+        for name, patterns, expected in _STATUS_CASES:
+            with self.subTest(name=name, ignore=patterns):
+                self.assertEqual(statuses.get(name), expected)
+
+    def test_status_cache_invalidated_by_stage(self):
+        repo_path, repo = self.create_repo()
+        (repo_path / 'new.txt').write_text('new')
+        self.assertIn(_EXPECTED_NEW, {(s.path, s.status) for s in repo.status()})
+        self.assertFalse(repo.has_staged_changes())
+        repo.stage(['new.txt'])
+        self.assertTrue(repo.has_staged_changes())
+        _git('rm', '--cached', 'file.txt', cwd=repo_path)
+        pairs = {(s.path, s.status) for s in repo.status()}
+        self.assertIn(('new.txt', 'A '), pairs)
+        self.assertIn(('file.txt', 'D '), pairs)
+        self.assertNotIn(_EXPECTED_NEW, pairs)
+
+    def test_stage_deleted_file(self):
+        repo_path, repo = self.create_repo()
+        (repo_path / 'file.txt').unlink()
+        (repo_path / 'new.txt').write_text('new')
+        repo.stage(['file.txt', 'new.txt'])
+        pairs = {(s.path, s.status) for s in repo.status()}
+        self.assertEqual(pairs, {('file.txt', 'D '), ('new.txt', 'A ')})
+        # staging an already staged deletion again is harmless
+        repo.stage(['file.txt'])
+        self.assertIn(('file.txt', 'D '), {(s.path, s.status) for s in repo.status()})
+
+    def test_stage_keeps_external_index_changes(self):
+        repo_path, repo = self.create_repo()
+        _write_files(repo_path, {'a.txt': b'a', 'b.txt': b'b', 'c.txt': b'c'})
+        repo.stage(['a.txt'])
+        _git('add', 'b.txt', cwd=repo_path)
+        repo.stage(['c.txt'])
+        staged = Repo(repo_path).git.diff('--cached', '--name-only').split()
+        self.assertEqual(staged, ['a.txt', 'b.txt', 'c.txt'])
+        repo.unstage(['a.txt'])
+        staged = Repo(repo_path).git.diff('--cached', '--name-only').split()
+        self.assertEqual(staged, ['b.txt', 'c.txt'])
+
+    def test_status_uses_index_stat_data(self):
+        repo_path, repo = self.create_repo()
+        (repo_path / 'other.txt').write_text('other')
+        repo.stage(['other.txt'])
+        repo.commit('other')
+        # record real stat data in the index, outside the racy window
+        past = time.time() - 60
+        for name in ('file.txt', 'other.txt'):
+            os.utime(repo_path / name, (past, past))
+        _git('update-index', '--refresh', cwd=repo_path)
+        repo.invalidate()
+        self.assertEqual(repo.status(), [])
+        (repo_path / 'file.txt').write_text('HELLO')
+        (repo_path / 'other.txt').unlink()
+        repo.invalidate()
+        pairs = {(s.path, s.status) for s in repo.status()}
+        self.assertEqual(pairs, {('file.txt', ' M'), ('other.txt', ' D')})
 
+    def test_status_literal_paths(self):
+        repo_path, repo = self.create_repo()
+        _write_files(repo_path, {':foo': b'a', '[ab].txt': b'b', 'a.txt': b'c'})
+        _git_script(
+            'git add -A && git -c user.email=t@t -c user.name=t commit -qm names',
+            repo_path,
+        )
+        # ':' is pathspec magic and '[ab]' a glob unless passed literally
+        _write_files(repo_path, {':foo': b'changed', '[ab].txt': b'changed'})
+        pairs = {(s.path, s.status) for s in repo.status()}
+        self.assertEqual(pairs, {(':foo', ' M'), ('[ab].txt', ' M')})
+        _git('add', '--', ':(literal):foo', cwd=repo_path)
+        repo.invalidate()
+        pairs = {(s.path, s.status) for s in repo.status()}
+        self.assertEqual(pairs, {(':foo', 'M '), ('[ab].txt', ' M')})
+
+    def test_status_conflict(self):
+        repo_path, repo = self.create_repo()
+        _git_script(
+            'git checkout -qb other && echo theirs > file.txt && '
+            'git -c user.email=t@t -c user.name=t commit -qam theirs && '
+            'git checkout -q master && echo ours > file.txt && '
+            'git -c user.email=t@t -c user.name=t commit -qam ours && '
+            '{ git -c user.email=t@t -c user.name=t merge -q other || true; }',
+            repo_path,
+        )
+        pairs = {(s.path, s.status) for s in repo.status()}
+        self.assertEqual(pairs, {('file.txt', 'UU')})
+        # the porcelain fallback reports the same code
+        _git('update-index', '--index-version', '4', cwd=repo_path)
+        repo.invalidate()
+        pairs = {(s.path, s.status) for s in repo.status()}
+        self.assertEqual(pairs, {('file.txt', 'UU')})
+
+    def test_untracked_cache(self):
+        repo_path, repo = self.create_repo()
+        (repo_path / 'src' / 'build').mkdir(parents=True)
+        _write_files(repo_path / 'src', {
+            'a.py': b'a',
+            'a.log': b'log',
+            'build/out.o': b'o',
+            '.gitignore': b'*.log\nbuild/\n',
+        })
+        past = time.time() - 60
+        for directory in (repo_path, repo_path / 'src', repo_path / 'src' / 'build'):
+            os.utime(directory, (past, past))
+        untracked = {s.path for s in repo.status() if s.status == '??'}
+        self.assertEqual(untracked, {'src/a.py', 'src/.gitignore'})
+
+        # a directory with an unchanged mtime is answered from the cache,
+        # also by a new Repository object reading the persisted copy
+        (repo_path / 'src' / 'b.py').write_text('b')
+        os.utime(repo_path / 'src', (past, past))
+        repo = Repository(str(repo_path))
+        self.addCleanup(repo.close)
+        untracked = {s.path for s in repo.status() if s.status == '??'}
+        self.assertNotIn('src/b.py', untracked)
+
+        os.utime(repo_path / 'src')
+        repo.invalidate()
+        untracked = {s.path for s in repo.status() if s.status == '??'}
+        self.assertEqual(untracked, {'src/a.py', 'src/b.py', 'src/.gitignore'})
+
+        # editing a .gitignore reclassifies its directory
+        (repo_path / 'src' / '.gitignore').write_text('*.log\n')
+        repo.invalidate()
+        untracked = {s.path for s in repo.status() if s.status == '??'}
+        self.assertIn('src/build/out.o', untracked)
+
+    def test_untracked_cache_not_rewritten_for_racy_directories(self):
+        repo_path, repo = self.create_repo()
+        (repo_path / 'new.txt').write_text('new')
+        cache_path = repo_path / '.git' / 'gitgui_untracked_cache.json.gz'
+        repo.status()
+        before = os.stat(cache_path)
+        # the root directory is still racy, so it is rescanned and re-stored
+        repo.invalidate()
+        self.assertIn(_EXPECTED_NEW, {(s.path, s.status) for s in repo.status()})
+        after = os.stat(cache_path)
+        self.assertEqual((after.st_ino, after.st_mtime_ns), (before.st_ino, before.st_mtime_ns))
+
+    def test_status_prefix(self):
+        repo_path, repo = self.create_repo()
+        (repo_path / 'src').mkdir()
+        (repo_path / 'srcx').mkdir()
+        (repo_path / 'src' / 'a.py').write_text('a')
+        repo.stage(['src/a.py'])
+        repo.commit('src')
+        _write_files(repo_path, {
+            'src/a.py': b'changed',
+            'src/new.py': b'new',
+            'srcx/b.py': b'b',
+            'file.txt': b'changed',
+        })
+        pairs = {(s.path, s.status) for s in repo.filter_statuses('src/')}
+        self.assertEqual(pairs, {('src/a.py', ' M'), ('src/new.py', '??')})
+        pairs = {(s.path, s.status) for s in repo.status(prefix='src')}
+        self.assertEqual(
+            pairs, {('src/a.py', ' M'), ('src/new.py', '??'), ('srcx/b.py', '??')}
+        )
+        self.assertEqual(len(repo.status()), 4)
+
+    def test_status_with_index_version_4(self):
+        repo_path, repo = self.create_repo()
+        _git('update-index', '--index-version', '4', cwd=repo_path)
+        _write_files(repo_path, {'file.txt': b'changed', 'odd\nname "q".txt': b'x'})
+        pairs = {(s.path, s.status) for s in repo.status()}
+        self.assertIn(('file.txt', ' M'), pairs)
+        self.assertIn(('odd\nname "q".txt', '??'), pairs)
+        repo.invalidate()
+        pairs = {(s.path, s.status) for s in repo.status(include_untracked=False)}
+        self.assertEqual(pairs, {('file.txt', ' M')})
+
+    @unittest.skipUnless(
+        os.environ.get('GIT_GUI_SLOW_TESTS') == '1',
+        'slow push test; set GIT_GUI_SLOW_TESTS=1',
+    )
     def test_push_review(self):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            repo_path = Path(tmpdir) / 'local'
-            remote_path = Path(tmpdir) / 'remote'
-            repo_path.mkdir()
-            remote_path.mkdir()
-            Repo.init(remote_path, bare=True)
-            self.create_repo(repo_path)
-            local_repo = Repo(repo_path)
-            local_repo.create_remote('origin', str(remote_path))
-            local_repo.remotes.origin.push('master:master')
-            (repo_path / 'new.txt').write_text('change')
-            local_repo.index.add(['new.txt'])
-            local_repo.index.commit('new commit')
-            repo = Repository(str(repo_path))
-            review = repo.push_review(remote='origin', branch='master')
-            self.assertIn('new commit', review)
+        base = _new_dir()
+        repo_path = base / 'local'
+        remote_path = base / 'remote'
+        _, repo = self.create_repo(repo_path)
+        # a local clone hardlinks the objects instead of sending a pack
+        Repo.clone_from(str(repo_path), str(remote_path), bare=True)
+        local_repo = Repo(repo_path)
+        local_repo.create_remote('origin', str(remote_path)).fetch()
+        (repo_path / 'new.txt').write_text('change')
+        local_repo.index.add(['new.txt'])
+        local_repo.index.commit('new commit')
+        # the remote was configured behind the object's back
+        repo.invalidate()
+        review = repo.push_review(remote='origin', branch='master')
+        self.assertIn('new commit', review)
+        repo.add_remote('origin', 'unused')
+        repo.add_remote('mirror', str(remote_path))
+        self.assertEqual({r.name for r in local_repo.remotes}, {'origin', 'mirror'})
+
+    def test_add_remote_sees_external_remote(self):
+        repo_path, repo = self.create_repo()
+        repo.add_remote('first', 'unused')
+        # age the config so the remote names are cached, not racy
+        os.utime(repo_path / '.git' / 'config', (0, 0))
+        repo.add_remote('first', 'unused')
+        _git('remote', 'add', 'external', 'unused', cwd=repo_path)
+        repo.add_remote('external', 'unused')
+        self.assertEqual({r.name for r in Repo(repo_path).remotes}, {'first', 'external'})
+
+    def test_add_remote_ignores_global_remotes(self):
+        repo_path, repo = self.create_repo()
+        home = _new_dir()
+        (home / '.gitconfig').write_text('[remote "shared"]\n\turl = elsewhere\n')
+        with mock.patch.dict(os.environ, {'HOME': str(home)}):
+            repo.add_remote('shared', 'unused')
+        self.assertIn('shared', {r.name for r in Repo(repo_path).remotes})
 
     def test_diff(self):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            repo_path = Path(tmpdir)
-            self.create_repo(repo_path)
-            file_path = repo_path / 'file.txt'
-            file_path.write_text('hello world')
-            repo = Repository(str(repo_path))
-            diff = repo.diff('file.txt')
-            self.assertIn('-hello', diff)
-            self.assertIn('+hello world', diff)
+        repo_path, repo = self.create_repo()
+        file_path = repo_path / 'file.txt'
+        file_path.write_text('hello world')
+        diff = repo.diff('file.txt')
+        self.assertIn('-hello', diff)
+        self.assertIn('+hello world', diff)
+        (repo_path / 'second file.txt').write_text('second')
+        repo.stage(['second file.txt'])
+        self.assertIn('+second', repo.diff('second file.txt', cached=True))
+        self.assertEqual(repo.diff('file.txt', cached=True), '')
+        # an edit after the whole-tree diff is not answered from it
+        file_path.write_text('hello again')
+        self.assertIn('+hello again', repo.diff('file.txt'))
+        self.assertEqual(repo.diff('second file.txt'), '')
+
+    def test_head_sha(self):
+        repo_path, repo = self.create_repo()
+        self.assertEqual(repo.head_sha(), Repo(repo_path).head.commit.hexsha)
+
+    def test_log_and_branch_cache_invalidation(self):
+        repo_path, repo = self.create_repo()
+        self.assertIn('init', repo.log())
+        self.assertEqual(repo.current_branch(), 'master')
+        (repo_path / 'new.txt').write_text('change')
+        repo.stage(['new.txt'])
+        repo.commit('second')
+        self.assertIn('second', repo.log())
+        self.assertEqual([summary for _, summary in repo.log_entries()], ['second', 'init'])
+        repo.create_branch('feature')
+        repo.checkout('feature')
+        self.assertEqual(repo.current_branch(), 'feature')
+        # branch changes made outside this object are picked up from
+        # the stat data of HEAD and refs/heads
+        _git('checkout', 'master', cwd=repo_path)
+        self.assertEqual(repo.current_branch(), 'master')
+        _git('branch', 'topic/one', cwd=repo_path)
+        self.assertIn('topic/one', repo.branches())
+
+    def test_refresh(self):
+        repo_path, repo = self.create_repo()
+        (repo_path / 'new.txt').write_text('new')
+        repo.create_branch('feature')
+        state = asyncio.run(repo.refresh())
+        self.assertEqual(state.statuses, repo.status())
+        self.assertEqual(state.branches, repo.branches())
+        self.assertEqual(state.current_branch, 'master')
+        repo.invalidate()
+        self.assertEqual(state.log, repo.log())
 
     def test_ignore(self):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            repo_path = Path(tmpdir)
-            self.create_repo(repo_path)
-            (repo_path / 'temp.log').write_text('temp')
-            repo = Repository(str(repo_path))
-            repo.ignore(['temp.log'])
-            gitignore = (repo_path / '.gitignore').read_text()
-            self.assertIn('temp.log', gitignore)
-            statuses = repo.status()
-            self.assertFalse(any(s.path == 'temp.log' for s in statuses))
+        repo_path, repo = self.create_repo()
+        repo.ignore(['temp.log'])
+        gitignore = (repo_path / '.gitignore').read_text()
+        self.assertIn('temp.log', gitignore)
+        (repo_path / '.gitignore').write_text('temp.log\n*.tmp')
+        repo.ignore(['*.tmp', 'out/', 'out/'])
+        self.assertEqual(
+            (repo_path / '.gitignore').read_text(), 'temp.log\n*.tmp\nout/\n'
+        )
 
     def test_branch_and_tag(self):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            repo_path = Path(tmpdir)
-            self.create_repo(repo_path)
-            repo = Repository(str(repo_path))
-            repo.create_branch('feature')
-            repo.checkout('feature')
-            (repo_path / 'feature.txt').write_text('data')
-            repo.stage(['feature.txt'])
-            repo.commit('add feature')
-            repo.create_tag('v1.0')
-            repo.checkout('master')
-            branches = repo.branches()
-            self.assertIn('feature', branches)
-            repo.delete_branch('feature', force=True)
-            self.assertNotIn('feature', repo.branches())
-            repo.delete_tag('v1.0')
+        repo_path, repo = self.create_repo()
+        (repo_path / 'feature.txt').write_text('data')
+        _git_script(
+            'git checkout -q -b feature && git add feature.txt && '
+            "git -c user.email=t@t -c user.name=t commit -qm 'add feature' && "
+            'git tag v1.0 && git checkout -q master',
+            repo_path,
+        )
+        branches = repo.branches()
+        self.assertIn('feature', branches)
+        repo.delete_branch('feature', force=True)
+        self.assertNotIn('feature', repo.branches())
+        repo.delete_tag('v1.0')
+
+    def test_reflog_tail(self):
+        repo_path, repo = self.create_repo()
+        for message in ('two', 'three'):
+            repo.commit(message)
+        with open(repo_path / '.git' / 'logs' / 'HEAD', encoding='utf-8') as fh:
+            full = fh.read()
+        self.assertEqual(repo.reflog(), full)
+        self.assertEqual(repo.reflog(max_lines=2), ''.join(full.splitlines(True)[-2:]))
+        self.assertEqual(repo.reflog(max_lines=0), '')
 
     def test_search_commits(self):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            repo_path = Path(tmpdir)
-            self.create_repo(repo_path)
-            repo = Repository(str(repo_path))
-            (repo_path / 'new.txt').write_text('change')
-            repo.stage(['new.txt'])
-            repo.commit('search target')
-            result = repo.search_commits('search target')
-            self.assertIn('search target', result)
+        repo_path, repo = self.create_repo()
+        (repo_path / 'new.txt').write_text('change')
+        repo.stage(['new.txt'])
+        repo.commit('search target')
+        result = repo.search_commits('search target')
+        self.assertIn('search target', result)
+        repo.commit('search target again')
+        result = repo.search_commits('search target', max_count=1)
+        self.assertEqual([line.split(' ', 1)[1] for line in result.splitlines()],
+                         ['search target again'])
+
+
+class _LockedResult:
+    """Serializes the calls worker threads make into a shared TestResult."""
+
+    def __init__(self, result: unittest.TestResult) -> None:
+        self._result = result
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self._result, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+
+class _ThreadedSuite(unittest.TestSuite):
+    """Run the tests of this module on a thread pool.
+
+    Each test works in its own repository copy and the time goes to
+    waiting on git, so threads overlap well. Module and class fixtures are
+    run once around the pool instead of by the standard suite; their
+    failures are reported on the result like the standard suite does.
+    """
+
+    def run(self, result, debug=False):
+        tests = list(self._flatten(self))
+        if debug:
+            # debug() wants exceptions raised in order, not collected
+            return unittest.TestSuite(tests).run(result, debug=True)
+        try:
+            setUpModule()
+        except Exception as exc:
+            self._createClassOrModuleLevelException(result, exc, 'setUpModule', __name__)
+            return result
+        try:
+            ready = []
+            for cls in dict.fromkeys(type(test) for test in tests):
+                if not getattr(cls, '__unittest_skip__', False):
+                    try:
+                        cls.setUpClass()
+                    except Exception as exc:
+                        self._createClassOrModuleLevelException(
+                            result, exc, 'setUpClass', self._class_name(cls)
+                        )
+                        continue
+                ready.append(cls)
+            try:
+                self._run_threaded([t for t in tests if type(t) in ready], result)
+            finally:
+                for cls in ready:
+                    if getattr(cls, '__unittest_skip__', False):
+                        continue
+                    try:
+                        cls.tearDownClass()
+                    except Exception as exc:
+                        self._createClassOrModuleLevelException(
+                            result, exc, 'tearDownClass', self._class_name(cls)
+                        )
+        finally:
+            try:
+                tearDownModule()
+            except Exception as exc:
+                self._createClassOrModuleLevelException(
+                    result, exc, 'tearDownModule', __name__
+                )
+        return result
+
+    @staticmethod
+    def _run_threaded(tests, result):
+        locked = _LockedResult(result)
+
+        def run_one(test):
+            # failfast and Ctrl-C set shouldStop; tests not started yet are dropped
+            if not result.shouldStop:
+                test(locked)
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=min(6, os.cpu_count() or 1)) as pool:
+            for test in tests:
+                if result.shouldStop:
+                    break
+                futures.append(pool.submit(run_one, test))
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def _class_name(cls):
+        return f'{cls.__module__}.{cls.__qualname__}'
+
+    @classmethod
+    def _flatten(cls, suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                yield from cls._flatten(test)
+            else:
+                yield test
+
+
+def load_tests(loader, standard_tests, pattern):
+    # used by ``python -m unittest``; pytest collects the tests itself
+    return _ThreadedSuite([standard_tests])
+
 
 if __name__ == '__main__':
     unittest.main()